@@ -13,6 +13,10 @@ import logging
 import os
 import requests
 import asyncio
+import hashlib
+import uuid
+
+from concurrent.futures import ThreadPoolExecutor
 
 from logging.handlers import RotatingFileHandler
 from logging import Formatter
@@ -28,6 +32,8 @@ CONFIG_JSON_URL = "http://{}:{}/public/default/config.json"
 DEFAULT_WEBSOCKET_PORT = 8765
 DEFAULT_HTTP_PORT = 8766
 DEFAULT_ROOM_PORT = 80
+UPLOAD_CHUNK_SIZE = 64 * 1024
+MAX_PARALLEL_UPLOADS = 4
 
 SELF_VIEW_SLOT = "#self:0" #"VideoCaptureSlot"
 SLIDE_SHOW_SLOT = "SlideShowSlot"
@@ -79,6 +85,52 @@ def getWebsocketPort(ip: str, room_port: int) -> int:
     return port
 
 
+def file_digest(filePath: str) -> str:
+    """Get sha256 of the file content. The file is read by chunks"""
+    h = hashlib.sha256()
+    with open(filePath, 'rb') as f:
+        while True:
+            chunk = f.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            h.update(chunk)
+
+    return h.hexdigest()
+
+
+class MultipartFileStream:
+    """multipart/form-data request body which reads the file from disk chunk by chunk.
+    The body length is known in advance, so requests sends it with Content-Length
+    without loading the whole file into memory"""
+    def __init__(self, filePath: str, field_name: str = 'file', chunk_size: int = UPLOAD_CHUNK_SIZE):
+        self.filePath = filePath
+        self.chunk_size = chunk_size
+        self.boundary = uuid.uuid4().hex
+        self.file_size = os.path.getsize(filePath)
+        file_name = os.path.basename(filePath)
+        self.head = (f'--{self.boundary}\r\n'
+                     f'Content-Disposition: form-data; name="{field_name}"; filename="{file_name}"\r\n'
+                     '\r\n').encode('utf-8')
+        self.tail = f'\r\n--{self.boundary}--\r\n'.encode('utf-8')
+
+    @property
+    def content_type(self) -> str:
+        return f'multipart/form-data; boundary={self.boundary}'
+
+    def __len__(self):
+        return len(self.head) + self.file_size + len(self.tail)
+
+    def __iter__(self):
+        yield self.head
+        with open(self.filePath, 'rb') as f:
+            while True:
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        yield self.tail
+
+
 class ConnectionStatus(IntEnum):
     unknown = 0
     started = 1
@@ -149,14 +201,25 @@ class Room:
         self.pin = ''
         self.url = ''
         self.tokenForHttpServer = ''
-        self.HttpPort = None
+        self.httpPort = None
+        # sha256 of a file content -> FileId on the Room HTTP server
+        self.uploadedFiles = {}
 
         self.systemInfo = {}
         self.settings = {}
+        # requestId -> settings sent by applySettings and not confirmed yet
+        self.pendingSettings = {}
+        # settings sent by setSettings without requestId, in the order of the commands
+        self.unnamedPendingSettings = []
         self.monitorsInfo = {}
 
         self.connection = None
         self.currentConference = None
+        self.createConferenceResponse = None
+        self.createConferenceRequestId = None
+        # (matrixType, participants) sent by the last changeVideoMatrix, None if it was rejected
+        self.currentMatrix = None
+        self.videoMatrixRequestId = None
 
         self.callback_OnChangeState = cb_OnChangeState
         self.callback_OnIncomingMessage = cb_OnIncomingMessage
@@ -298,6 +361,14 @@ class Room:
 
         return result
 
+    def isReplyTo(self, response: dict, method: str, requestId: str) -> bool:
+        """Check if the response is the reply to the last command of the method sent with requestId.
+        A response with requestId is matched by it, a response without it by the method name"""
+        responseId = response.get("requestId")
+        if responseId:
+            return responseId == requestId
+        return method.lower() == str(response.get("method", "")).lower()
+
     async def processErrorInResponse(self, response) -> bool:
         result = False
         # CHECK SCHEMA
@@ -306,6 +377,15 @@ class Room:
             s = f'Room error: {response["error"]}'
             self.dbg_print(s)
             logger.error(s)
+            # the failed command must not stay pending
+            method_name = str(response.get("method", "")).lower()
+            requestId = response.get("requestId")
+            if "setSettings".lower() == method_name or (requestId and requestId in self.pendingSettings):
+                self.confirmSettings(response)
+            elif self.isReplyTo(response, "createConference", self.createConferenceRequestId):
+                self.createConferenceResponse = response
+            elif self.isReplyTo(response, "changeVideoMatrix", self.videoMatrixRequestId):
+                self.currentMatrix = None
 
         return result
 
@@ -340,10 +420,19 @@ class Room:
                 self.systemInfo = response
             elif "getSettings".lower() == method_name.lower():
                 self.settings = response
+            elif "setSettings".lower() == method_name.lower():
+                self.confirmSettings(response)
             elif "getMonitorsInfo".lower() == method_name.lower():
                 self.monitorsInfo = response
             elif "getConferences".lower() == method_name.lower():
                 self.currentConference = response
+            elif "createConference".lower() == method_name.lower():
+                if self.isReplyTo(response, "createConference", self.createConferenceRequestId):
+                    self.createConferenceResponse = response
+            elif "changeVideoMatrix".lower() == method_name.lower():
+                if (self.isReplyTo(response, "changeVideoMatrix", self.videoMatrixRequestId) and
+                        not response.get("result", True)):
+                    self.currentMatrix = None
             # ================================================
 
             # Callback func
@@ -391,6 +480,9 @@ class Room:
         self.pin = pin
         self.in_stopping = False
         self.tokenForHttpServer = ""
+        self.uploadedFiles = {}
+        self.pendingSettings = {}
+        self.unnamedPendingSettings = []
 
         self.wsPort = getWebsocketPort(ip, port)
         self.httpPort = getHttpPort(ip, port)
@@ -444,6 +536,19 @@ class Room:
 
         return fileName
 
+    def get_picture_selfview(self, timeout: float = None) -> bytes:
+        """Get the current self view frame. Returns None if the room is not ready or the request failed"""
+        url = self.getURL_SelfVideo()
+        if not url:
+            return None
+
+        response = requests.get(url, timeout=timeout)
+        if response.status_code == 200:
+            return response.content
+        else:
+            self.dbg_print(f'Failed to get a self view picture: {response.status_code}')
+            return None
+
     ''' getAppState
        * none       = 0 (No connection to the server and the terminal does nothing),
        * connect    = 1 (the terminal tries to connect to the server),
@@ -555,30 +660,63 @@ class Room:
         command = {"method": "hangUp", "forAll": forAll}
         self.send_command_to_room(command)
 
-    def setBackground(self, filePath: str = ""):
-        # Check on file empty
-        if not filePath:
-            logger.info('Empty path')
-            command = {"method": "setBackground"}
-            self.send_command_to_room(command)
-            return
+    def uploadFile(self, filePath: str, digest: str = None) -> int:
+        """Upload a file to the Room HTTP server and return its FileId.
+        The file is streamed from disk. A file with the same content already uploaded
+        to this room is not sent again, the cached FileId is returned instead.
 
+        Parameters
+        ----------
+            filePath: str
+                Path to the file;
+            digest: str
+                sha256 of the file content (see file_digest). Calculated if not specified.
+        """
         try:
-            files = {'file': open(filePath, 'rb')}
-        except IOError:
+            if digest is None:
+                digest = file_digest(filePath)
+            fileId = self.uploadedFiles.get(digest)
+            if fileId is not None:
+                self.dbg_print(f'File is already uploaded: {filePath}, FileId = {fileId}')
+                return fileId
+            body = MultipartFileStream(filePath)
+        except OSError:
             logger.info('File not accessible')
-            return
+            return None
 
         # make request
-        url = URL_UPLOAD_FILE.format(self.ip, self.HttpPort, self.tokenForHttpServer)
-        response = requests.post(url, files=files)
+        url = URL_UPLOAD_FILE.format(self.ip, self.httpPort, self.tokenForHttpServer)
+        response = requests.post(url, data=body, headers={"Content-Type": body.content_type})
         if response.status_code == 200:
-            data = response.headers
-            command = {"method": "setBackground", "fileId": int(data["FileId"])}
-            self.send_command_to_room(command)
+            fileId = int(response.headers["FileId"])
+            self.uploadedFiles[digest] = fileId
+            return fileId
         else:
             self.dbg_print(response.text)
-        return
+            return None
+
+    def setBackground(self, filePath: str = "", digest: str = None) -> int:
+        """Set the background image. Empty path resets the background.
+
+        Parameters
+        ----------
+            filePath: str
+                Path to the image file;
+            digest: str
+                sha256 of the file content. Calculated if not specified.
+        """
+        # Check on file empty
+        if not filePath:
+            logger.info('Empty path')
+            command = {"method": "setBackground"}
+            self.send_command_to_room(command)
+            return None
+
+        fileId = self.uploadFile(filePath, digest)
+        if fileId is not None:
+            command = {"method": "setBackground", "fileId": fileId}
+            self.send_command_to_room(command)
+        return fileId
 
     ''' {
     "method" : "createConference"
@@ -595,14 +733,18 @@ class Room:
     def updateConferenceInfo(self):
         # clear current conference info
         self.currentConference = None
+        if self.app_state != 5:
+            self.currentMatrix = None
         # update info
         if self.app_state == 5:
             self.requestGetConferences()
         
         
     def createConferenceSymmetric(self, title: str, autoAccept: bool, inviteList: []):
-        command = {"method": "createConference", "title": title, "confType": "symmetric",
-                   "autoAccept": autoAccept, "inviteList": inviteList}
+        self.createConferenceResponse = None
+        self.createConferenceRequestId = uuid.uuid4().hex
+        command = {"method": "createConference", "requestId": self.createConferenceRequestId, "title": title,
+                   "confType": "symmetric", "autoAccept": autoAccept, "inviteList": list(inviteList)}
         self.send_command_to_room(command)
 
     def connectToServer(self, server: str, port: int = 4307):
@@ -638,8 +780,66 @@ class Room:
                 For example, ```{"defaultP2PMatrix": 3}```
         """
         command = {"method": "setSettings", "settings": settings}
+        self.unnamedPendingSettings.append(settings)
         self.send_command_to_room(command)
 
+    def getCachedSettings(self) -> dict:
+        """Get the settings received by the last requestSettings() with the confirmed changes applied"""
+        return self.settings.get("settings", {})
+
+    def applySettings(self, desired: dict) -> dict:
+        """Bring the application settings to the desired state.
+        Only the keys which differ from the cached settings are sent, in one setSettings command.
+        The cache is updated from the setSettings response, no full refetch is needed.
+
+        Parameters
+        ----------
+            desired: dict
+                Desired settings. For example, ```{"defaultP2PMatrix": 3}```
+
+        Returns
+        -------
+        dict
+            {"changed": keys sent, "skipped": keys already set,
+             "bytes_sent": command size, "bytes_saved": size saved against sending all the keys}
+        """
+        current = self.getCachedSettings()
+        changed = {k: v for k, v in desired.items() if k not in current or current[k] != v}
+
+        requestId = uuid.uuid4().hex
+        full_size = len(json.dumps({"method": "setSettings", "requestId": requestId, "settings": desired}))
+        sent_size = 0
+        if changed:
+            command = {"method": "setSettings", "requestId": requestId, "settings": changed}
+            self.pendingSettings[requestId] = changed
+            sent_size = len(json.dumps(command))
+            self.send_command_to_room(command)
+
+        report = {"changed": len(changed), "skipped": len(desired) - len(changed),
+                  "bytes_sent": sent_size, "bytes_saved": max(full_size - sent_size, 0)}
+        self.dbg_print(f'applySettings: {report}')
+        return report
+
+    def confirmSettings(self, response: dict):
+        """Apply a setSettings response to the cached settings.
+        A response with requestId confirms only the command with this requestId, a response
+        without it confirms the oldest setSettings command sent without requestId"""
+        requestId = response.get("requestId")
+        if requestId:
+            changed = self.pendingSettings.pop(requestId, None)
+        elif self.unnamedPendingSettings:
+            changed = self.unnamedPendingSettings.pop(0)
+        else:
+            changed = None
+
+        if changed is None or "error" in response or not response.get("result", True):
+            return
+        # changes reported by the application take precedence over the sent ones
+        if isinstance(response.get("settings"), dict):
+            changed = {**changed, **response["settings"]}
+        if changed:
+            self.settings.setdefault("settings", {}).update(changed)
+
     def shutdownRoom(self, forAll: bool):
         """Shutdown application"""
         command = {"method": "shutdown", "forAll": forAll}
@@ -650,7 +850,7 @@ class Room:
         command = {"method": "getConferences"}
         self.send_command_to_room(command)
         
-    def changeVideoMatrix(self, matrixType: int, participants: list):
+    def changeVideoMatrix(self, matrixType: int, participants: list, skipUnchanged: bool = False) -> bool:
         """
         Specify video matrix and the ratio of video windows for available slots. It is used only in the conference.
 
@@ -664,7 +864,15 @@ class Room:
             - one = 2,  display only the video of the conference participant who is the first in the participants list (for any type of the conference); 
             - oneSelf = 3, big video of the conference participant and a small selfview in the corner (for video call).
         participants: list
-            the list of video slots and conference participants
+            the list of video slots and conference participants. The list is not modified
+        skipUnchanged: bool
+            do not send the command if the same matrix has already been set in the current conference
+            and the room has not rejected it
+
+        Returns
+        -------
+        bool
+            True if the command was sent
 
         Example
         -------
@@ -677,15 +885,23 @@ class Room:
         ```
         """
         
+        layout = self.getLayout(participants)
+        if skipUnchanged and self.currentMatrix == (matrixType, layout):
+            self.dbg_print('Video matrix is not changed')
+            return False
+
+        self.videoMatrixRequestId = uuid.uuid4().hex
+        command = {"method": "changeVideoMatrix", "requestId": self.videoMatrixRequestId, "matrixType": matrixType,
+                   "participants": list(layout)}
+        self.currentMatrix = (matrixType, layout)
+        self.send_command_to_room(command)
+        return True
+
+    def getLayout(self, participants: list) -> tuple:
+        """Get the participants list with the logged ID replaced to SELF_VIEW_SLOT"""
         # Replace logged ID to SELF_VIEW_SLOT - "VideoCaptureSlot"
         my_id = self.getMyId()
-        if my_id:
-            for i, user in enumerate(participants):
-                if my_id == user:
-                    participants[i] = SELF_VIEW_SLOT
-
-        command = {"method": "changeVideoMatrix", "matrixType": matrixType, "participants": participants}
-        self.send_command_to_room(command)
+        return tuple(SELF_VIEW_SLOT if my_id and user == my_id else user for user in participants)
         
     def getMyId(self) -> str:
         """
@@ -775,4 +991,40 @@ def make_connection(pin=None, room_ip='127.0.0.1', port=80, debug_mode=False,
             room.caughtConnectionError()
 
     return room
+
+
+def setBackgroundForRooms(rooms: list, filePath: str, max_workers: int = MAX_PARALLEL_UPLOADS) -> dict:
+    """Set the same background image for many rooms. Uploads run in parallel,
+    at most max_workers at a time. The file content hash is calculated once and
+    rooms which already have this file do not upload it again.
+
+    Returns
+    -------
+    dict
+        {room: FileId or None}
+    """
+    try:
+        digest = file_digest(filePath)
+    except OSError:
+        logger.info('File not accessible')
+        return {room: None for room in rooms}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {room: executor.submit(room.setBackground, filePath, digest) for room in rooms}
+
+    result = {}
+    for room, future in futures.items():
+        try:
+            result[room] = future.result()
+        except Exception as e:
+            logger.error(f'Failed to set background for {room.ip}: {e}')
+            result[room] = None
+
+    return result
 # =====================================================================
+
+from .framestore import FrameStore, FrameStoreReader
+from .snapshots import SnapshotScheduler
+from .gateway import RoomGateway, GatewayClient, make_gateway_connection
+from .eventsink import SQLiteEventSink
+from .conferences import createConferences, changeVideoMatrices
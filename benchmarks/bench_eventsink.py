@@ -0,0 +1,43 @@
+# coding=utf8
+'''''
+Ingest throughput of SQLiteEventSink.
+
+    python benchmarks/bench_eventsink.py -n 200000
+'''
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tests'))
+from tcroom_loader import load_tcroom  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure SQLiteEventSink ingest throughput')
+    parser.add_argument('-n', '--events', type=int, default=200000, help='Number of events')
+    parser.add_argument('--rooms', type=int, default=10, help='Number of rooms the events are spread over')
+    parser.add_argument('--batch-size', type=int, default=None)
+    parser.add_argument('--db', default=None, help='Database file (a temporary file by default)')
+    args = parser.parse_args()
+
+    tcroom = load_tcroom()
+    from tcroom.eventsink import DEFAULT_BATCH_SIZE, EVENT_KIND
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.db or os.path.join(tmp, 'events.db')
+        sink = tcroom.SQLiteEventSink(path, batch_size=args.batch_size or DEFAULT_BATCH_SIZE)
+
+        started = time.perf_counter()
+        for i in range(args.events):
+            event = {"event": "appStateChanged", "appState": i % 7, "method": "event"}
+            sink.add(f'room{i % args.rooms}', EVENT_KIND, "appStateChanged", event)
+        sink.close()
+        elapsed = time.perf_counter() - started
+
+    print(f'{sink.written} events in {elapsed:.2f} s: {sink.written / elapsed:.0f} events/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+# coding=utf8
+'''''
+Bulk conference orchestration across many rooms.
+'''
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from . import logger
+
+MAX_PARALLEL_CONFERENCES = 64
+DEFAULT_CONFERENCE_TIMEOUT = 30  # sec
+SLEEP = 0.1
+
+IN_CONFERENCE_STATE = 5
+
+STATUS_STARTED = "started"
+STATUS_FAILED = "failed"
+STATUS_TIMEOUT = "timeout"
+
+
+def _wait_for_conference(room, timeout: float) -> str:
+    """Wait until the room is in the conference or createConference fails"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if room.getAppState() == IN_CONFERENCE_STATE:
+            return STATUS_STARTED
+        response = room.createConferenceResponse
+        if response is not None and ("error" in response or not response.get("result", True)):
+            return STATUS_FAILED
+        time.sleep(SLEEP)
+    return STATUS_TIMEOUT
+
+
+def _create_conference(room, spec: dict, timeout: float) -> dict:
+    started = time.monotonic()
+    if room.getAppState() == IN_CONFERENCE_STATE:
+        logger.warning(f'Room {room.ip} is already in a conference')
+        return {"status": STATUS_FAILED, "elapsed": 0.0}
+
+    room.createConferenceSymmetric(spec["title"], spec.get("autoAccept", False), spec["inviteList"])
+    status = _wait_for_conference(room, timeout)
+    if status == STATUS_STARTED and spec.get("participants") is not None:
+        room.changeVideoMatrix(spec.get("matrixType", 0), spec["participants"])
+
+    return {"status": status, "elapsed": time.monotonic() - started}
+
+
+def createConferences(specs: dict, timeout: float = DEFAULT_CONFERENCE_TIMEOUT,
+                      max_workers: int = MAX_PARALLEL_CONFERENCES) -> dict:
+    """Create symmetric conferences in many rooms at once and wait for them to start.
+
+    Parameters
+    ----------
+        specs: dict
+            {room: {"title": str, "inviteList": list, "autoAccept": bool,
+                    "matrixType": int, "participants": list}}.
+            autoAccept, matrixType and participants are optional. The video matrix is set
+            when the conference has started;
+        timeout: float
+            Max time to wait for a conference to start, sec.
+
+    Returns
+    -------
+    dict
+        {room: {"status": "started" | "failed" | "timeout", "elapsed": sec}}
+    """
+    result = {}
+    if not specs:
+        return result
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(specs))) as executor:
+        futures = {room: executor.submit(_create_conference, room, spec, timeout) for room, spec in specs.items()}
+
+    for room, future in futures.items():
+        try:
+            result[room] = future.result()
+        except Exception as e:
+            logger.error(f'Failed to create a conference in {room.ip}: {e}')
+            result[room] = {"status": STATUS_FAILED, "error": str(e)}
+
+    return result
+
+
+def changeVideoMatrices(layouts: dict) -> dict:
+    """Set video matrices in many rooms. Rooms where the same matrix has been set and not rejected are skipped.
+
+    Parameters
+    ----------
+        layouts: dict
+            {room: (matrixType, participants)}
+
+    Returns
+    -------
+    dict
+        {room: True if the command was sent}
+    """
+    result = {}
+    # changeVideoMatrix only sends a websocket command, no need for threads
+    for room, (matrixType, participants) in layouts.items():
+        try:
+            result[room] = room.changeVideoMatrix(matrixType, participants, skipUnchanged=True)
+        except Exception as e:
+            logger.error(f'Failed to change the video matrix in {room.ip}: {e}')
+            result[room] = False
+
+    return result
@@ -0,0 +1,160 @@
+# coding=utf8
+'''''
+Batched persistence of Room events and method responses to SQLite.
+
+Example:
+    sink = tcroom.SQLiteEventSink("events.db")
+    cb_OnEvent, cb_OnMethod = sink.callbacks("room1")
+    room = tcroom.make_connection(pin="123", room_ip="192.168.31.62", cb_OnEvent=cb_OnEvent, cb_OnMethod=cb_OnMethod)
+    ...
+    sink.close()
+'''
+import json
+import time
+import queue
+import sqlite3
+import threading
+
+from . import logger, RoomException
+
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_FLUSH_INTERVAL = 1.0   # sec
+DEFAULT_MAX_BUFFER = 100000    # events waiting to be written
+
+EVENT_KIND = "event"
+METHOD_KIND = "method"
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS events ("
+    " id INTEGER PRIMARY KEY,"
+    " time REAL NOT NULL,"
+    " room TEXT NOT NULL,"
+    " kind TEXT NOT NULL,"
+    " name TEXT NOT NULL,"
+    " payload TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS events_room_time ON events (room, time)",
+    "CREATE INDEX IF NOT EXISTS events_name_time ON events (name, time)",
+    "CREATE INDEX IF NOT EXISTS events_time ON events (time)",
+)
+INSERT = "INSERT INTO events (time, room, kind, name, payload) VALUES (?, ?, ?, ?, ?)"
+
+_STOP = object()
+
+
+class SQLiteEventSink:
+    """Buffer events in memory and write them to SQLite in batches from a background thread.
+
+    A batch is written in one transaction when batch_size events are buffered or flush_interval
+    has passed since the first buffered event. When max_buffer events are waiting, add() blocks
+    until the writer catches up.
+
+    Parameters
+    ----------
+        path: str
+            Database file;
+        batch_size: int
+            Max events in one transaction;
+        flush_interval: float
+            Max time an event waits in the buffer, sec;
+        max_buffer: int
+            Max events waiting to be written.
+    """
+    def __init__(self, path: str,
+                 batch_size: int = DEFAULT_BATCH_SIZE,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+                 max_buffer: int = DEFAULT_MAX_BUFFER):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.buffer = queue.Queue(maxsize=max_buffer)
+        self.written = 0
+        self.closed = False
+
+        # create the schema before returning, so errors are raised to the caller
+        connection = self.open()
+        connection.close()
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def open(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        with connection:
+            for sql in SCHEMA:
+                connection.execute(sql)
+        return connection
+
+    def add(self, room_id: str, kind: str, name: str, payload: dict, timestamp: float = None) -> None:
+        """Buffer an event. Blocks while the buffer is full"""
+        if self.closed:
+            raise RoomException(f'Event sink is closed: {self.path}')
+        if timestamp is None:
+            timestamp = time.time()
+        self.buffer.put((timestamp, room_id, kind, name, json.dumps(payload)))
+
+    def callbacks(self, room_id: str) -> tuple:
+        """Get (cb_OnEvent, cb_OnMethod) for make_connection which save everything of the room"""
+        async def on_event(name, response):
+            self.add(room_id, EVENT_KIND, name, response)
+
+        async def on_method(name, response):
+            self.add(room_id, METHOD_KIND, name, response)
+
+        return on_event, on_method
+
+    def write(self, connection: sqlite3.Connection, batch: list) -> None:
+        try:
+            with connection:
+                # the same SQL text reuses the prepared statement for every row
+                connection.executemany(INSERT, batch)
+            self.written += len(batch)
+        except sqlite3.Error as e:
+            logger.error(f'Failed to write {len(batch)} events to {self.path}: {e}')
+
+    def run(self):
+        connection = self.open()
+        stopping = False
+        while not stopping:
+            item = self.buffer.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self.buffer.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self.write(connection, batch)
+        connection.close()
+
+    def close(self):
+        """Write the buffered events and stop the writer"""
+        if self.closed:
+            return
+        self.closed = True
+        self.buffer.put(_STOP)
+        self.thread.join()
+
+        # events added concurrently with close() are after _STOP: release their add() calls
+        lost = 0
+        while True:
+            try:
+                self.buffer.get_nowait()
+            except queue.Empty:
+                break
+            lost += 1
+        if lost:
+            logger.warning(f'{lost} events were added to {self.path} while closing and are not written')
@@ -0,0 +1,199 @@
+# coding=utf8
+'''''
+Segmented on-disk frame store.
+
+Layout of the store directory:
+    000001.seg, 000002.seg, ...  - frames data, appended one after another
+    <room>.idx                   - per room index, fixed size records sorted by timestamp:
+                                   timestamp (double), segment (uint32), offset (uint64), length (uint32)
+
+Readers memory-map the index and segment files and look up frames with a binary search.
+'''
+import os
+import mmap
+import struct
+import threading
+from urllib.parse import quote, unquote
+
+DEFAULT_SEGMENT_SIZE = 64 * 1024 ** 2  # 64 MB
+SEGMENT_FILE = "{:06d}.seg"
+INDEX_EXT = ".idx"
+
+INDEX_RECORD = struct.Struct('<dIQI')
+
+
+def _index_file(path: str, room_id: str) -> str:
+    return os.path.join(path, quote(room_id, safe='') + INDEX_EXT)
+
+
+class FrameStore:
+    """Append frames of many rooms to the segmented store. Thread safe"""
+    def __init__(self, path: str, segment_size: int = DEFAULT_SEGMENT_SIZE):
+        self.path = path
+        self.segment_size = segment_size
+        self.lock = threading.Lock()
+        self.indexes = {}        # room_id -> [file, last timestamp]
+        os.makedirs(path, exist_ok=True)
+
+        segments = [int(name[:-4]) for name in os.listdir(path) if name.endswith(".seg") and name[:-4].isdigit()]
+        self.segment = max(segments, default=1)
+        self.segment_file = open(os.path.join(path, SEGMENT_FILE.format(self.segment)), 'ab')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _open_index(self, room_id: str) -> list:
+        index = self.indexes.get(room_id)
+        if index is None:
+            f = open(_index_file(self.path, room_id), 'a+b')
+            last_timestamp = 0.0
+            size = f.seek(0, os.SEEK_END)
+            size -= size % INDEX_RECORD.size  # drop a torn record
+            if size:
+                f.seek(size - INDEX_RECORD.size)
+                last_timestamp = INDEX_RECORD.unpack(f.read(INDEX_RECORD.size))[0]
+            f.truncate(size)
+            index = self.indexes[room_id] = [f, last_timestamp]
+        return index
+
+    def append(self, room_id: str, timestamp: float, data: bytes) -> None:
+        """Append a frame. Timestamps of the same room must not go back,
+        an earlier timestamp is stored as the last one"""
+        with self.lock:
+            if self.segment_file.tell() and self.segment_file.tell() + len(data) > self.segment_size:
+                self.segment_file.close()
+                self.segment += 1
+                self.segment_file = open(os.path.join(self.path, SEGMENT_FILE.format(self.segment)), 'ab')
+
+            offset = self.segment_file.tell()
+            self.segment_file.write(data)
+            # written before the index record, so readers do not see a record ahead of its data.
+            # There is no fsync: after a crash a record may point past the segment end, readers skip it
+            self.segment_file.flush()
+
+            index = self._open_index(room_id)
+            timestamp = max(timestamp, index[1])
+            index[0].write(INDEX_RECORD.pack(timestamp, self.segment, offset, len(data)))
+            index[0].flush()
+            index[1] = timestamp
+
+    def close(self):
+        with self.lock:
+            self.segment_file.close()
+            for f, _ in self.indexes.values():
+                f.close()
+            self.indexes = {}
+
+
+class FrameStoreReader:
+    """Memory-mapped read access to the frame store. Call refresh() to see frames appended after opening"""
+    def __init__(self, path: str):
+        self.path = path
+        self.indexes = {}        # room_id -> (mmap, records count)
+        self.segments = {}       # segment number -> mmap
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def rooms(self) -> list:
+        return [unquote(name[:-len(INDEX_EXT)]) for name in os.listdir(self.path) if name.endswith(INDEX_EXT)]
+
+    def refresh(self):
+        """Drop the mapped files, so new frames become visible"""
+        self.close()
+
+    def _index(self, room_id: str):
+        index = self.indexes.get(room_id)
+        if index is None:
+            try:
+                with open(_index_file(self.path, room_id), 'rb') as f:
+                    count = os.fstat(f.fileno()).st_size // INDEX_RECORD.size
+                    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if count else b''
+            except FileNotFoundError:
+                data, count = b'', 0
+            index = self.indexes[room_id] = (data, count)
+        return index
+
+    def _segment(self, segment: int):
+        data = self.segments.get(segment)
+        if data is None:
+            with open(os.path.join(self.path, SEGMENT_FILE.format(segment)), 'rb') as f:
+                data = self.segments[segment] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return data
+
+    def _record(self, room_id: str, i: int) -> tuple:
+        return INDEX_RECORD.unpack_from(self._index(room_id)[0], i * INDEX_RECORD.size)
+
+    def _bisect(self, room_id: str, timestamp: float, right: bool = True) -> int:
+        """Number of frames with time <= timestamp (or < timestamp if not right)"""
+        lo, hi = 0, self.count(room_id)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            t = self._record(room_id, mid)[0]
+            if t < timestamp or (right and t == timestamp):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _frame(self, record: tuple) -> tuple:
+        """Get (timestamp, bytes) of the record, None if the frame data is lost"""
+        timestamp, segment, offset, length = record
+        if not length:
+            return timestamp, b''
+        try:
+            data = self._segment(segment)
+            if offset + length > len(data):
+                # the segment was mapped before this frame was appended
+                data.close()
+                del self.segments[segment]
+                data = self._segment(segment)
+        except (FileNotFoundError, ValueError):
+            # the segment file is missing or empty
+            return None
+        if offset + length > len(data):
+            return None
+        return timestamp, data[offset:offset + length]
+
+    def count(self, room_id: str) -> int:
+        return self._index(room_id)[1]
+
+    def find(self, room_id: str, timestamp: float) -> tuple:
+        """Get the last frame taken at or before the timestamp. Frames with lost data are skipped
+
+        Returns
+        -------
+        (timestamp, bytes) or None
+        """
+        for i in range(self._bisect(room_id, timestamp) - 1, -1, -1):
+            frame = self._frame(self._record(room_id, i))
+            if frame is not None:
+                return frame
+        return None
+
+    def frames(self, room_id: str, start: float = float('-inf'), end: float = float('inf')):
+        """Iterate (timestamp, bytes) of the frames taken in [start, end]"""
+        i = self._bisect(room_id, start, right=False)
+        while i < self.count(room_id):
+            record = self._record(room_id, i)
+            if record[0] > end:
+                break
+            frame = self._frame(record)
+            if frame is not None:
+                yield frame
+            i += 1
+
+    def close(self):
+        for data, _ in self.indexes.values():
+            if isinstance(data, mmap.mmap):
+                data.close()
+        for data in self.segments.values():
+            data.close()
+        self.indexes = {}
+        self.segments = {}
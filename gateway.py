@@ -0,0 +1,367 @@
+# coding=utf8
+'''''
+Gateway: one authenticated Room connection shared by many local processes over a Unix socket.
+
+Run the daemon:
+    python -m tcroom.gateway --room 192.168.31.62 123 /tmp/room1.sock
+
+Attach from a service:
+    room = tcroom.make_gateway_connection("/tmp/room1.sock", events=["incomingChatMessage"])
+    room.call("echotest@trueconf.com")
+
+The protocol is newline-delimited JSON: the same commands and responses as the Room websocket API.
+The gateway replaces requestId of the forwarded commands and restores it in the response, so every
+response goes back to the client that sent the command. getAppState, getSystemInfo, getSettings and
+getMonitorsInfo are answered from the gateway cache. Clients do not authenticate, access is limited
+by the socket file permissions.
+'''
+import os
+import json
+import time
+import socket
+import asyncio
+import argparse
+import threading
+import itertools
+from collections import OrderedDict
+
+from . import Room, ConnectionStatus, ConnectToRoomException, logger, DEFAULT_ROOM_PORT
+
+try:
+    import thread
+except ImportError:
+    import _thread as thread
+
+GATEWAY_HELLO = "gatewayHello"
+GATEWAY_SUBSCRIBE = "gatewaySubscribe"
+RECONNECT_DELAY = 5                  # sec
+MAX_CLIENT_BUFFER = 1024 ** 2 * 4    # 4 MB of unsent data before a slow client is dropped
+
+
+class _GatewayRoom(Room):
+    """Room connection of the gateway. Every incoming message is also passed to the gateway"""
+    def __init__(self, gateway, debug_mode):
+        super().__init__(debug_mode, None, None, None, None, None)
+        self.gateway = gateway
+
+    def on_message(self, ws, message):
+        super().on_message(ws, message)
+        self.gateway.loop.call_soon_threadsafe(self.gateway.dispatch, message)
+
+
+class _Client:
+    def __init__(self, writer):
+        self.writer = writer
+        self.events = None  # None - all events
+
+    def send(self, response: dict):
+        if self.writer.is_closing():
+            return
+        if self.writer.transport.get_write_buffer_size() > MAX_CLIENT_BUFFER:
+            logger.warning('Gateway client does not read, disconnecting')
+            self.writer.close()
+            return
+        self.writer.write(json.dumps(response).encode('utf-8') + b'\n')
+
+
+def _with_request_id(response: dict, requestId) -> dict:
+    response = dict(response)
+    if requestId is None:
+        response.pop("requestId", None)
+    else:
+        response["requestId"] = requestId
+    return response
+
+
+class RoomGateway:
+    """Hold one connection to the Room application and serve it to local clients over a Unix socket.
+
+    Parameters
+    ----------
+        socket_path: str
+            Unix socket file. The file is created with 0600 permissions;
+        pin: str
+            Room PIN;
+        room_ip: str
+            Room IP address;
+        port: int
+            Room port.
+    """
+    def __init__(self, socket_path: str, pin: str = None, room_ip: str = '127.0.0.1',
+                 port: int = DEFAULT_ROOM_PORT, debug_mode: bool = False):
+        self.socket_path = socket_path
+        self.pin = pin
+        self.room_ip = room_ip
+        self.port = port
+        self.debug_mode = debug_mode
+
+        self.loop = None
+        self.room = None
+        self.clients = set()
+        # gateway requestId -> (client, client's requestId, method)
+        self.pending = OrderedDict()
+        self.waiting_auth = []
+        self.counter = itertools.count(1)
+
+    # ===================================================
+    # Room -> clients
+    # ===================================================
+    def dispatch(self, message: str):
+        try:
+            response = json.loads(message)
+        except ValueError:
+            return
+
+        if "event" in response:
+            name = response["event"]
+            if name == "appStateChanged":
+                # login/logout changes authInfo, keep the cached systemInfo actual
+                self.send_to_room(self.room.requestSystemInfo)
+            for client in list(self.clients):
+                if client.events is None or name in client.events or name == "appStateChanged":
+                    client.send(response)
+            return
+
+        method = response.get("method", "").lower()
+        if method == "auth":
+            for client, requestId in self.waiting_auth:
+                client.send(self.auth_response(requestId, response.get("result", False)))
+            self.waiting_auth = []
+            return
+
+        entry = self.pending.pop(response.get("requestId"), None)
+        if entry is None and method:
+            # requestId is not returned: responses come in the order of the commands
+            for gw_id, (_, _, pending_method) in self.pending.items():
+                if pending_method.lower() == method:
+                    entry = self.pending.pop(gw_id)
+                    break
+        if entry is not None:
+            client, requestId, _ = entry
+            if client in self.clients:
+                client.send(_with_request_id(response, requestId))
+
+    # ===================================================
+    # Clients -> Room
+    # ===================================================
+    def auth_response(self, requestId, result: bool = True) -> dict:
+        response = {"method": "auth", "result": result}
+        if result:
+            response["tokenForHttpServer"] = self.room.tokenForHttpServer
+        return _with_request_id(response, requestId)
+
+    def cached_response(self, method: str) -> dict:
+        if not self.room.isReady():
+            return None
+        if method == "getappstate":
+            return {"method": "getAppState", "appState": self.room.app_state, "result": True}
+        cache = {"getsysteminfo": self.room.systemInfo,
+                 "getsettings": self.room.settings,
+                 "getmonitorsinfo": self.room.monitorsInfo}.get(method)
+        return cache or None
+
+    def send_to_room(self, func, *args) -> bool:
+        try:
+            func(*args)
+        except Exception as e:
+            logger.error(f'Gateway failed to send a command to the room: {e}')
+            return False
+        return True
+
+    def handle_command(self, client: _Client, command: dict):
+        method = command.get("method", "")
+        m = method.lower()
+        requestId = command.get("requestId")
+        cached = self.cached_response(m)
+
+        if m == GATEWAY_SUBSCRIBE.lower():
+            events = command.get("events")
+            client.events = None if events is None else set(events)
+        elif m == "auth":
+            if self.room.isReady():
+                client.send(self.auth_response(requestId))
+            else:
+                self.waiting_auth.append((client, requestId))
+        elif cached is not None:
+            client.send(_with_request_id(cached, requestId))
+        else:
+            gw_id = f'gw-{next(self.counter)}'
+            self.pending[gw_id] = (client, requestId, method)
+            if m == "setsettings":
+                # the response updates the gateway settings cache
+                self.room.pendingSettings[gw_id] = command.get("settings", {})
+            if not self.send_to_room(self.room.send_command_to_room, {**command, "requestId": gw_id}):
+                self.pending.pop(gw_id, None)
+                self.room.pendingSettings.pop(gw_id, None)
+                client.send(_with_request_id({"method": method, "error": "Room is not connected"}, requestId))
+
+    async def handle_client(self, reader, writer):
+        client = _Client(writer)
+        client.send({"method": GATEWAY_HELLO, "ip": self.room.ip, "httpPort": self.room.httpPort})
+        self.clients.add(client)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    command = json.loads(line)
+                except ValueError:
+                    client.send({"error": "Invalid JSON"})
+                    continue
+                self.handle_command(client, command)
+        finally:
+            self.clients.discard(client)
+            writer.close()
+
+    # ===================================================
+    def fail_pending(self, error: str):
+        """Send an error reply for every request in flight and forget them"""
+        for client, requestId, method in self.pending.values():
+            if client in self.clients:
+                client.send(_with_request_id({"method": method, "error": error}, requestId))
+        for client, requestId in self.waiting_auth:
+            if client in self.clients:
+                client.send(_with_request_id({"method": "auth", "error": error}, requestId))
+        self.pending.clear()
+        self.waiting_auth = []
+        self.room.pendingSettings = {}
+
+    async def keep_connected(self):
+        while True:
+            if self.room.connection_status == ConnectionStatus.close:
+                logger.info(f'Gateway reconnecting to {self.room_ip}')
+                self.fail_pending("Room connection lost")
+                await self.loop.run_in_executor(None, self.room.connect, self.room_ip, self.port, self.pin)
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def serve(self):
+        """Connect to the room and serve the clients forever"""
+        self.loop = asyncio.get_running_loop()
+        self.room = _GatewayRoom(self, self.debug_mode)
+        await self.loop.run_in_executor(None, self.room.connect, self.room_ip, self.port, self.pin)
+
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        # a bound socket refuses connections until listen(): restrict it before start_unix_server listens
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.bind(self.socket_path)
+            os.chmod(self.socket_path, 0o600)
+        except OSError:
+            sock.close()
+            raise
+        server = await asyncio.start_unix_server(self.handle_client, sock=sock)
+        logger.info(f'Gateway for {self.room_ip} is listening on {self.socket_path}')
+
+        async with server:
+            await asyncio.gather(server.serve_forever(), self.keep_connected())
+
+
+async def run_gateways(gateways: list):
+    await asyncio.gather(*[gateway.serve() for gateway in gateways])
+
+
+# =====================================================================
+class GatewayClient(Room):
+    """Room API over a gateway socket. Has the same methods and callbacks as Room"""
+    def __init__(self, debug_mode, events,
+                 cb_OnChangeState,
+                 cb_OnIncomingMessage,
+                 cb_OnIncomingCommand,
+                 cb_OnEvent,
+                 cb_OnMethod):
+        super().__init__(debug_mode, cb_OnChangeState, cb_OnIncomingMessage, cb_OnIncomingCommand,
+                         cb_OnEvent, cb_OnMethod)
+        self.events = events
+        self.socket = None
+        self.stream = None
+        self.send_lock = threading.Lock()
+
+    def connect(self, socket_path: str) -> None:
+        """Connect to the gateway"""
+        self.url = socket_path
+        self.tokenForHttpServer = ""
+        try:
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.socket.connect(socket_path)
+            self.stream = self.socket.makefile('rwb')
+            hello = json.loads(self.stream.readline())
+        except (OSError, ValueError) as e:
+            raise ConnectToRoomException(f'Gateway is not running: {socket_path}. {e}')
+
+        self.ip = hello["ip"]
+        self.httpPort = hello["httpPort"]
+        self.setConnectionStatus(ConnectionStatus.connected)
+        if self.events is not None:
+            self.send_command_to_room({"method": GATEWAY_SUBSCRIBE, "events": list(self.events)})
+        self.auth(None)
+        thread.start_new_thread(self.run, ())
+
+    def run(self):
+        for line in self.stream:
+            self.on_message(None, line)
+        self.on_close(None)
+
+    def send_command_to_room(self, command: dict):
+        self.dbg_print(f'Sending command to gateway: {command}')
+        with self.send_lock:
+            self.stream.write(json.dumps(command).encode('utf-8') + b'\n')
+            self.stream.flush()
+
+    def disconnect(self):
+        """Disconnect from the gateway"""
+        super().disconnect()
+        try:
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+def make_gateway_connection(socket_path: str, events: list = None, debug_mode=False,
+                            cb_OnChangeState=None,
+                            cb_OnIncomingMessage=None,
+                            cb_OnIncomingCommand=None,
+                            cb_OnEvent=None,
+                            cb_OnMethod=None):
+    """Connect to TrueConf Room through the gateway. The gateway must be running
+
+    Parameters
+    ----------
+        socket_path: str
+            Gateway Unix socket file;
+        events: list
+            Names of the events to receive. None - all events. appStateChanged is always received.
+    """
+    room = GatewayClient(debug_mode, events, cb_OnChangeState, cb_OnIncomingMessage, cb_OnIncomingCommand,
+                         cb_OnEvent, cb_OnMethod)
+    room.connect(socket_path)
+
+    # Wait for ~5 sec...
+    WAIT_FOR_SEC, SLEEP = 5, 0.1
+    for i in range(round(WAIT_FOR_SEC / SLEEP)):
+        if room.isReady():
+            break
+        time.sleep(SLEEP)
+        if i >= round(WAIT_FOR_SEC / SLEEP) - 1:
+            logger.error('Connection timed out')
+            room.caughtConnectionError()
+
+    return room
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description='Share one TrueConf Room connection between local processes')
+    parser.add_argument('--room', nargs=3, action='append', required=True, metavar=('IP', 'PIN', 'SOCKET'),
+                        help='Room IP, PIN ("" if none) and the Unix socket file. May be repeated')
+    parser.add_argument('--port', type=int, default=DEFAULT_ROOM_PORT, help='Room port')
+    parser.add_argument('--debug', action='store_true')
+    args = parser.parse_args(argv)
+
+    gateways = [RoomGateway(socket_path, pin=pin or None, room_ip=ip, port=args.port, debug_mode=args.debug)
+                for ip, pin, socket_path in args.room]
+    asyncio.run(run_gateways(gateways))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+# coding=utf8
+'''''
+Periodic self view snapshots of many rooms.
+'''
+import time
+import random
+import asyncio
+import threading
+
+from . import logger
+
+DEFAULT_SNAPSHOT_INTERVAL = 60  # sec
+DEFAULT_SNAPSHOT_JITTER = 0.1   # +-10% of the interval
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_SNAPSHOT_TIMEOUT = 10   # sec
+
+
+class SnapshotScheduler:
+    """Capture self view frames of the rooms concurrently and append them to a FrameStore.
+
+    Parameters
+    ----------
+        rooms: list or dict
+            Room objects, or {room_id: Room}. Room IP is used as room_id for a list;
+        store: FrameStore
+            Where the frames are saved;
+        interval: float
+            Time between two snapshots of the same room, sec;
+        jitter: float
+            Random deviation of the interval, a fraction of the interval.
+            The first snapshots are also spread over the interval;
+        max_concurrency: int
+            Max number of the snapshot requests running at the same time for all rooms.
+
+    Example
+    -------
+    ```
+    import tcroom
+
+    store = tcroom.FrameStore("frames")
+    scheduler = tcroom.SnapshotScheduler(rooms, store, interval=30)
+    scheduler.start()
+    ...
+    scheduler.stop()
+    ```
+    """
+    def __init__(self, rooms, store,
+                 interval: float = DEFAULT_SNAPSHOT_INTERVAL,
+                 jitter: float = DEFAULT_SNAPSHOT_JITTER,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 timeout: float = DEFAULT_SNAPSHOT_TIMEOUT):
+        self.rooms = rooms if isinstance(rooms, dict) else {room.ip: room for room in rooms}
+        self.store = store
+        self.interval = interval
+        self.jitter = jitter
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+
+        self.loop = None
+        self.stop_event = None
+        self.stopping = False
+        self.thread = None
+
+    def next_delay(self) -> float:
+        return self.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    async def wait(self, delay: float) -> bool:
+        """Sleep for delay. Returns True if the scheduler is stopped"""
+        try:
+            await asyncio.wait_for(self.stop_event.wait(), timeout=delay)
+        except asyncio.TimeoutError:
+            pass
+        return self.stop_event.is_set()
+
+    async def capture(self, room_id: str, room, semaphore: asyncio.Semaphore) -> None:
+        async with semaphore:
+            try:
+                data = await self.loop.run_in_executor(None, room.get_picture_selfview, self.timeout)
+            except Exception as e:
+                logger.warning(f'Failed to take a snapshot of {room_id}: {e}')
+                return
+            timestamp = time.time()
+        if data:
+            await self.loop.run_in_executor(None, self.store.append, room_id, timestamp, data)
+
+    async def run_room(self, room_id: str, room, semaphore: asyncio.Semaphore) -> None:
+        if await self.wait(random.uniform(0, self.interval)):
+            return
+        while True:
+            await self.capture(room_id, room, semaphore)
+            if await self.wait(self.next_delay()):
+                return
+
+    async def run(self) -> None:
+        """Capture the frames until stop() is called"""
+        self.loop = asyncio.get_running_loop()
+        self.stop_event = asyncio.Event()
+        if self.stopping:
+            return
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        await asyncio.gather(*[self.run_room(room_id, room, semaphore) for room_id, room in self.rooms.items()])
+
+    def start(self) -> None:
+        """Run the scheduler in a background thread"""
+        self.thread = threading.Thread(target=asyncio.run, args=(self.run(),), daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stopping = True
+        if self.loop and self.stop_event:
+            self.loop.call_soon_threadsafe(self.stop_event.set)
+        if self.thread:
+            self.thread.join()
+            self.thread = None
@@ -0,0 +1,4 @@
+# coding=utf8
+from tcroom_loader import load_tcroom
+
+load_tcroom()
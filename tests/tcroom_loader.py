@@ -0,0 +1,20 @@
+# coding=utf8
+'''''
+The repository root is the tcroom package itself: load it under its package name.
+Used by the tests and the benchmarks.
+'''
+import os
+import sys
+import importlib.util
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_tcroom():
+    if 'tcroom' not in sys.modules:
+        spec = importlib.util.spec_from_file_location('tcroom', os.path.join(ROOT, '__init__.py'),
+                                                      submodule_search_locations=[ROOT])
+        module = importlib.util.module_from_spec(spec)
+        sys.modules['tcroom'] = module
+        spec.loader.exec_module(module)
+    return sys.modules['tcroom']
@@ -0,0 +1,147 @@
+# coding=utf8
+import json
+import time
+import asyncio
+import threading
+
+import tcroom
+
+
+def make_room(my_id: str = "me@server") -> tcroom.Room:
+    room = tcroom.Room(False, None, None, None, None, None)
+    room.ip = "10.0.0.1"
+    room.systemInfo = {"authInfo": {"peerId": my_id}}
+    room.requestGetConferences = lambda: None
+    room.sent = []
+    room.send_command_to_room = room.sent.append
+    return room
+
+
+def receive(room: tcroom.Room, response: dict):
+    asyncio.run(room.processMessage(json.dumps(response)))
+
+
+def test_layout_replaces_my_id():
+    room = make_room()
+    participants = ["a", "me@server", "b"]
+
+    assert room.getLayout(participants) == ("a", tcroom.SELF_VIEW_SLOT, "b")
+    assert make_room(None).getLayout(participants) == tuple(participants)
+
+
+def test_participants_are_not_modified():
+    room = make_room()
+    participants = ["a", "me@server"]
+
+    room.changeVideoMatrix(1, participants)
+
+    assert participants == ["a", "me@server"]
+    assert room.sent[0]["participants"] == ["a", tcroom.SELF_VIEW_SLOT]
+
+
+def test_same_matrix_is_sent_again_by_default():
+    room = make_room()
+
+    assert room.changeVideoMatrix(1, ["a", "b"])
+    assert room.changeVideoMatrix(1, ["a", "b"])
+    assert len(room.sent) == 2
+    assert room.sent[0]["requestId"] != room.sent[1]["requestId"]
+
+
+def test_unchanged_matrix_is_skipped_on_request():
+    room = make_room()
+
+    assert room.changeVideoMatrix(1, ["a", "b"], skipUnchanged=True)
+    assert not room.changeVideoMatrix(1, ["a", "b"], skipUnchanged=True)
+    assert room.changeVideoMatrix(0, ["a", "b"], skipUnchanged=True)
+    assert len(room.sent) == 2
+
+
+def test_rejected_matrix_is_not_skipped():
+    room = make_room()
+    room.changeVideoMatrix(1, ["a"])
+    receive(room, {"requestId": room.sent[0]["requestId"], "error": "Participant is not in the conference"})
+    assert room.changeVideoMatrix(1, ["a"], skipUnchanged=True)
+
+    receive(room, {"method": "changeVideoMatrix", "requestId": room.sent[1]["requestId"], "result": False})
+    assert room.changeVideoMatrix(1, ["a"], skipUnchanged=True)
+
+    receive(room, {"method": "changeVideoMatrix", "requestId": room.sent[2]["requestId"], "result": True})
+    assert not room.changeVideoMatrix(1, ["a"], skipUnchanged=True)
+
+
+def test_reply_to_an_older_matrix_does_not_clear_the_current_one():
+    room = make_room()
+    room.changeVideoMatrix(1, ["a"])
+    room.changeVideoMatrix(1, ["b"])
+
+    receive(room, {"requestId": room.sent[0]["requestId"], "error": "Rejected"})
+
+    assert not room.changeVideoMatrix(1, ["b"], skipUnchanged=True)
+
+
+def test_matrix_is_sent_again_after_the_conference():
+    room = make_room()
+    receive(room, {"event": "appStateChanged", "appState": 5, "method": "event"})
+    room.changeVideoMatrix(1, ["a"])
+
+    receive(room, {"event": "appStateChanged", "appState": 3, "method": "event"})
+
+    assert room.changeVideoMatrix(1, ["a"], skipUnchanged=True)
+
+
+def test_change_video_matrices():
+    rooms = [make_room(), make_room()]
+    rooms[0].changeVideoMatrix(1, ["a"])
+
+    result = tcroom.changeVideoMatrices({room: (1, ["a"]) for room in rooms})
+
+    assert result == {rooms[0]: False, rooms[1]: True}
+
+
+def reply_later(room: tcroom.Room, response: dict):
+    threading.Timer(0.05, receive, (room, response)).start()
+
+
+def test_create_conferences_reports_per_room_status():
+    started, rejected, errored = make_room(), make_room(), make_room()
+    started.send_command_to_room = lambda command: reply_later(
+        started, {"event": "appStateChanged", "appState": 5, "method": "event"})
+    rejected.send_command_to_room = lambda command: reply_later(
+        rejected, {"method": "createConference", "result": False})
+    errored.send_command_to_room = lambda command: reply_later(
+        errored, {"method": "createConference", "requestId": command["requestId"], "result": False,
+                  "error": "Invalid invite list"})
+
+    t = time.monotonic()
+    result = tcroom.createConferences({room: {"title": "t", "inviteList": ["a"]}
+                                       for room in (started, rejected, errored)}, timeout=5)
+
+    assert time.monotonic() - t < 2
+    assert result[started]["status"] == "started"
+    assert result[rejected]["status"] == "failed"
+    assert result[errored]["status"] == "failed"
+
+
+def test_create_conference_error_without_method():
+    room = make_room()
+    room.send_command_to_room = lambda command: reply_later(
+        room, {"requestId": command["requestId"], "error": "Invalid invite list"})
+
+    result = tcroom.createConferences({room: {"title": "t", "inviteList": ["a"]}}, timeout=5)
+
+    assert result[room]["status"] == "failed"
+
+
+def test_late_reply_to_an_earlier_conference_is_ignored():
+    room = make_room()
+    room.createConferenceSymmetric("old", False, ["a"])
+    old_requestId = room.sent[0]["requestId"]
+    room.createConferenceSymmetric("new", False, ["a"])
+
+    receive(room, {"method": "createConference", "requestId": old_requestId, "result": False})
+    receive(room, {"requestId": old_requestId, "error": "Timed out"})
+    assert room.createConferenceResponse is None
+
+    receive(room, {"method": "createConference", "requestId": room.sent[1]["requestId"], "result": True})
+    assert room.createConferenceResponse["result"]
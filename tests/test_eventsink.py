@@ -0,0 +1,87 @@
+# coding=utf8
+import time
+import asyncio
+import threading
+import sqlite3
+
+import pytest
+
+import tcroom
+
+
+def test_events_are_written(tmp_path):
+    path = str(tmp_path / "events.db")
+    sink = tcroom.SQLiteEventSink(path, batch_size=7)
+    on_event, on_method = sink.callbacks("room1")
+    for i in range(50):
+        asyncio.run(on_event("appStateChanged", {"appState": i}))
+    asyncio.run(on_method("getSettings", {"result": True}))
+    sink.close()
+
+    assert sink.written == 51
+    connection = sqlite3.connect(path)
+    assert connection.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+    assert connection.execute("SELECT count(*) FROM events WHERE room = 'room1' AND name = 'appStateChanged'"
+                              ).fetchone() == (50,)
+    assert connection.execute("SELECT kind FROM events WHERE name = 'getSettings'").fetchone() == ("method",)
+    connection.close()
+
+
+def test_add_after_close_raises(tmp_path):
+    sink = tcroom.SQLiteEventSink(str(tmp_path / "events.db"), max_buffer=1)
+    sink.close()
+    sink.close()
+
+    with pytest.raises(tcroom.RoomException):
+        sink.add("room1", "event", "appStateChanged", {})
+
+
+def count_rows(path: str) -> int:
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute("SELECT count(*) FROM events").fetchone()[0]
+    finally:
+        connection.close()
+
+
+def test_partial_batch_is_flushed_by_time(tmp_path):
+    path = str(tmp_path / "events.db")
+    sink = tcroom.SQLiteEventSink(path, batch_size=1000, flush_interval=0.1)
+    for i in range(3):
+        sink.add("room1", "event", "appStateChanged", {"appState": i})
+
+    deadline = time.monotonic() + 2
+    while count_rows(path) < 3 and time.monotonic() < deadline:
+        time.sleep(0.02)
+
+    assert count_rows(path) == 3
+    assert sink.written == 3
+    sink.close()
+
+
+def test_add_blocks_while_the_buffer_is_full(tmp_path):
+    sink = tcroom.SQLiteEventSink(str(tmp_path / "events.db"), batch_size=1, max_buffer=2)
+    release = threading.Event()
+    write = sink.write
+
+    def slow_write(connection, batch):
+        release.wait()
+        write(connection, batch)
+
+    sink.write = slow_write
+    # the writer takes the first event and waits in write(), the next two fill the buffer
+    for i in range(3):
+        sink.add("room1", "event", "e", {"n": i})
+    while sink.buffer.qsize() < 2:
+        time.sleep(0.01)
+
+    blocked = threading.Thread(target=sink.add, args=("room1", "event", "e", {"n": 3}))
+    blocked.start()
+    blocked.join(0.2)
+    assert blocked.is_alive()
+
+    release.set()
+    blocked.join(2)
+    assert not blocked.is_alive()
+    sink.close()
+    assert sink.written == 4
@@ -0,0 +1,129 @@
+# coding=utf8
+import os
+
+from tcroom.framestore import FrameStore, FrameStoreReader, INDEX_RECORD, _index_file
+
+
+def frame(room_id, i):
+    return f'{room_id}-{i}'.encode() * 4
+
+
+def fill(path, rooms, count, segment_size, start=0):
+    with FrameStore(path, segment_size=segment_size) as store:
+        for i in range(start, start + count):
+            for room_id in rooms:
+                store.append(room_id, float(i), frame(room_id, i))
+
+
+def test_roundtrip_across_segment_rollover(tmp_path):
+    rooms = ["10.0.0.1", "room/2:80"]
+    fill(str(tmp_path), rooms, 20, segment_size=100)
+
+    assert len([name for name in os.listdir(tmp_path) if name.endswith(".seg")]) > 1
+    with FrameStoreReader(str(tmp_path)) as reader:
+        assert sorted(reader.rooms()) == sorted(rooms)
+        for room_id in rooms:
+            assert reader.count(room_id) == 20
+            assert list(reader.frames(room_id)) == [(float(i), frame(room_id, i)) for i in range(20)]
+
+
+def test_find(tmp_path):
+    fill(str(tmp_path), ["r"], 10, segment_size=50)
+
+    with FrameStoreReader(str(tmp_path)) as reader:
+        assert reader.find("r", -1.0) is None
+        assert reader.find("r", 0.0) == (0.0, frame("r", 0))
+        assert reader.find("r", 4.0) == (4.0, frame("r", 4))
+        assert reader.find("r", 4.5) == (4.0, frame("r", 4))
+        assert reader.find("r", 100.0) == (9.0, frame("r", 9))
+        assert reader.find("unknown", 100.0) is None
+
+
+def test_frames_range_bounds_are_inclusive(tmp_path):
+    fill(str(tmp_path), ["r"], 10, segment_size=50)
+
+    with FrameStoreReader(str(tmp_path)) as reader:
+        assert [t for t, _ in reader.frames("r", 3.0, 6.0)] == [3.0, 4.0, 5.0, 6.0]
+        assert [t for t, _ in reader.frames("r", 2.5, 3.5)] == [3.0]
+        assert [t for t, _ in reader.frames("r", 10.0)] == []
+        assert list(reader.frames("unknown")) == []
+
+
+def test_equal_timestamps(tmp_path):
+    with FrameStore(str(tmp_path)) as store:
+        for i in range(5):
+            store.append("r", 1.0 if i < 4 else 2.0, frame("r", i))
+
+    with FrameStoreReader(str(tmp_path)) as reader:
+        assert [data for _, data in reader.frames("r", 1.0, 1.0)] == [frame("r", i) for i in range(4)]
+        assert reader.find("r", 1.0) == (1.0, frame("r", 3))
+
+
+def test_earlier_timestamp_is_stored_as_last(tmp_path):
+    with FrameStore(str(tmp_path)) as store:
+        store.append("r", 5.0, b"a")
+        store.append("r", 3.0, b"b")
+
+    with FrameStoreReader(str(tmp_path)) as reader:
+        assert list(reader.frames("r")) == [(5.0, b"a"), (5.0, b"b")]
+
+
+def test_writer_reopen_continues_the_store(tmp_path):
+    fill(str(tmp_path), ["r"], 5, segment_size=60)
+    fill(str(tmp_path), ["r"], 5, segment_size=60, start=5)
+
+    with FrameStoreReader(str(tmp_path)) as reader:
+        assert list(reader.frames("r")) == [(float(i), frame("r", i)) for i in range(10)]
+
+
+def test_torn_index_record_is_dropped_on_reopen(tmp_path):
+    fill(str(tmp_path), ["r"], 3, segment_size=1000)
+    with open(_index_file(str(tmp_path), "r"), 'ab') as f:
+        f.write(b'\x01' * (INDEX_RECORD.size // 2))
+
+    fill(str(tmp_path), ["r"], 2, segment_size=1000, start=3)
+
+    assert os.path.getsize(_index_file(str(tmp_path), "r")) == 5 * INDEX_RECORD.size
+    with FrameStoreReader(str(tmp_path)) as reader:
+        assert list(reader.frames("r")) == [(float(i), frame("r", i)) for i in range(5)]
+
+
+def test_reader_remaps_a_grown_segment(tmp_path):
+    store = FrameStore(str(tmp_path), segment_size=1000)
+    store.append("a", 1.0, b"first")
+
+    reader = FrameStoreReader(str(tmp_path))
+    assert reader.find("a", 1.0) == (1.0, b"first")
+
+    # the segment is mapped; a frame appended to it afterwards is beyond the mapping
+    store.append("b", 2.0, b"second")
+    assert reader.find("b", 2.0) == (2.0, b"second")
+
+    # the index of "a" is mapped too: refresh() makes new records visible
+    store.append("a", 3.0, b"third")
+    assert reader.count("a") == 1
+    reader.refresh()
+    assert reader.find("a", 3.0) == (3.0, b"third")
+
+    reader.close()
+    store.close()
+
+
+def test_record_past_the_segment_end_is_skipped(tmp_path):
+    fill(str(tmp_path), ["r"], 3, segment_size=1000)
+    # a crash lost the tail of the segment, the index records survived
+    segment = tmp_path / "000001.seg"
+    segment.write_bytes(segment.read_bytes()[:-3])
+
+    with FrameStoreReader(str(tmp_path)) as reader:
+        assert list(reader.frames("r")) == [(float(i), frame("r", i)) for i in range(2)]
+        assert reader.find("r", 2.0) == (1.0, frame("r", 1))
+
+
+def test_missing_segment_is_skipped(tmp_path):
+    fill(str(tmp_path), ["r"], 1, segment_size=1000)
+    os.remove(tmp_path / "000001.seg")
+
+    with FrameStoreReader(str(tmp_path)) as reader:
+        assert list(reader.frames("r")) == []
+        assert reader.find("r", 0.0) is None
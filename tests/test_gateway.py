@@ -0,0 +1,191 @@
+# coding=utf8
+import os
+import json
+import stat
+import asyncio
+
+import tcroom
+from tcroom import gateway
+
+
+def fake_connect(self, ip, port, pin=None):
+    """Authenticated room which records the commands and does not answer them"""
+    self.ip = ip
+    self.httpPort = 8766
+    self.tokenForHttpServer = "token"
+    self.sent = []
+    self.send_command_to_room = self.sent.append
+    self.setConnectionStatus(tcroom.ConnectionStatus.normal)
+
+
+def run_gateway(tmp_path, monkeypatch, body):
+    """Start a gateway with a fake room and run body(gw, socket_path) in its loop"""
+    monkeypatch.setattr(gateway._GatewayRoom, "connect", fake_connect)
+    path = str(tmp_path / "gw.sock")
+
+    async def run():
+        gw = tcroom.RoomGateway(path, room_ip="10.0.0.1")
+        task = asyncio.ensure_future(gw.serve())
+        while True:
+            try:
+                _, writer = await asyncio.open_unix_connection(path)
+                writer.close()
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                await asyncio.sleep(0.01)
+        try:
+            return await body(gw, path)
+        finally:
+            task.cancel()
+
+    return asyncio.run(run())
+
+
+async def connect(path: str):
+    reader, writer = await asyncio.open_unix_connection(path)
+    hello = json.loads(await reader.readline())
+    assert hello == {"method": "gatewayHello", "ip": "10.0.0.1", "httpPort": 8766}
+    return reader, writer
+
+
+async def send(writer, command: dict):
+    writer.write(json.dumps(command).encode() + b'\n')
+    await writer.drain()
+
+
+async def read(reader) -> dict:
+    return json.loads(await asyncio.wait_for(reader.readline(), 5))
+
+
+async def wait_sent(gw, count: int) -> list:
+    while len(gw.room.sent) < count:
+        await asyncio.sleep(0.01)
+    return gw.room.sent
+
+
+async def room_reply(gw, response: dict):
+    # the websocket thread of the room calls on_message
+    await asyncio.get_running_loop().run_in_executor(None, gw.room.on_message, None, json.dumps(response))
+
+
+def test_socket_is_created_owner_only(tmp_path, monkeypatch):
+    umask = os.umask(0o022)
+    try:
+        async def body(gw, path):
+            return stat.S_IMODE(os.stat(path).st_mode)
+
+        assert run_gateway(tmp_path, monkeypatch, body) == 0o600
+        assert os.umask(0o022) == 0o022
+    finally:
+        os.umask(umask)
+
+
+def test_replies_are_routed_to_the_sender(tmp_path, monkeypatch):
+    async def body(gw, path):
+        reader1, writer1 = await connect(path)
+        reader2, writer2 = await connect(path)
+        await send(writer1, {"method": "call", "peerId": "p1", "requestId": "same"})
+        await send(writer2, {"method": "call", "peerId": "p2", "requestId": "same"})
+        await send(writer2, {"method": "hangUp"})
+        sent = await wait_sent(gw, 3)
+
+        assert len({command["requestId"] for command in sent}) == 3
+        by_peer = {command.get("peerId"): command["requestId"] for command in sent}
+        await room_reply(gw, {"method": "call", "requestId": by_peer["p2"], "result": True, "n": 2})
+        await room_reply(gw, {"method": "call", "requestId": by_peer["p1"], "result": True, "n": 1})
+        await room_reply(gw, {"method": "hangUp", "requestId": by_peer[None], "result": True})
+
+        assert await read(reader1) == {"method": "call", "requestId": "same", "result": True, "n": 1}
+        assert await read(reader2) == {"method": "call", "requestId": "same", "result": True, "n": 2}
+        # the client did not send requestId: the reply has none
+        assert await read(reader2) == {"method": "hangUp", "result": True}
+        assert not gw.pending
+
+    run_gateway(tmp_path, monkeypatch, body)
+
+
+def test_replies_without_request_id_follow_the_command_order(tmp_path, monkeypatch):
+    async def body(gw, path):
+        reader1, writer1 = await connect(path)
+        reader2, writer2 = await connect(path)
+        await send(writer1, {"method": "getConferences", "requestId": "first"})
+        await wait_sent(gw, 1)
+        await send(writer2, {"method": "getConferences", "requestId": "second"})
+        await wait_sent(gw, 2)
+
+        await room_reply(gw, {"method": "getConferences", "n": 1})
+        await room_reply(gw, {"method": "getConferences", "n": 2})
+
+        assert await read(reader1) == {"method": "getConferences", "requestId": "first", "n": 1}
+        assert await read(reader2) == {"method": "getConferences", "requestId": "second", "n": 2}
+
+    run_gateway(tmp_path, monkeypatch, body)
+
+
+def test_events_follow_the_subscriptions(tmp_path, monkeypatch):
+    async def body(gw, path):
+        reader1, writer1 = await connect(path)
+        reader2, writer2 = await connect(path)
+        await send(writer1, {"method": "gatewaySubscribe", "events": ["x"]})
+        while all(client.events is None for client in gw.clients):
+            await asyncio.sleep(0.01)
+
+        for name in ("y", "x"):
+            await room_reply(gw, {"event": name, "method": "event"})
+        await room_reply(gw, {"event": "appStateChanged", "appState": 3, "method": "event"})
+
+        assert [(await read(reader1))["event"] for _ in range(2)] == ["x", "appStateChanged"]
+        assert [(await read(reader2))["event"] for _ in range(3)] == ["y", "x", "appStateChanged"]
+
+    run_gateway(tmp_path, monkeypatch, body)
+
+
+def test_snapshot_state_is_answered_from_the_cache(tmp_path, monkeypatch):
+    async def body(gw, path):
+        gw.room.settings = {"method": "getSettings", "result": True, "settings": {"a": 1}}
+        gw.room.systemInfo = {"method": "getSystemInfo", "result": True, "authInfo": {"peerId": "me"}}
+        reader, writer = await connect(path)
+
+        await send(writer, {"method": "getSettings", "requestId": "s"})
+        await send(writer, {"method": "getSystemInfo"})
+        await send(writer, {"method": "getAppState", "requestId": "a"})
+
+        assert await read(reader) == {"method": "getSettings", "result": True, "settings": {"a": 1},
+                                      "requestId": "s"}
+        assert (await read(reader))["authInfo"] == {"peerId": "me"}
+        assert await read(reader) == {"method": "getAppState", "appState": 0, "result": True, "requestId": "a"}
+        assert gw.room.sent == []
+
+    run_gateway(tmp_path, monkeypatch, body)
+
+
+def test_client_set_settings_updates_the_cache(tmp_path, monkeypatch):
+    async def body(gw, path):
+        gw.room.settings = {"method": "getSettings", "result": True, "settings": {"a": 1, "b": 1}}
+        reader, writer = await connect(path)
+
+        await send(writer, {"method": "setSettings", "settings": {"a": 2}, "requestId": "q"})
+        sent = await wait_sent(gw, 1)
+        await room_reply(gw, {"method": "setSettings", "requestId": sent[0]["requestId"], "result": True})
+        assert await read(reader) == {"method": "setSettings", "requestId": "q", "result": True}
+
+        await send(writer, {"method": "getSettings"})
+        assert (await read(reader))["settings"] == {"a": 2, "b": 1}
+
+    run_gateway(tmp_path, monkeypatch, body)
+
+
+def test_pending_requests_fail_on_connection_lost(tmp_path, monkeypatch):
+    async def body(gw, path):
+        reader, writer = await connect(path)
+        await send(writer, {"method": "call", "peerId": "p", "requestId": "mine"})
+        await wait_sent(gw, 1)
+        gw.room.pendingSettings["x"] = {}
+
+        gw.fail_pending("Room connection lost")
+
+        assert await read(reader) == {"method": "call", "error": "Room connection lost", "requestId": "mine"}
+        assert not gw.pending
+        assert gw.room.pendingSettings == {}
+
+    run_gateway(tmp_path, monkeypatch, body)
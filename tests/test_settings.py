@@ -0,0 +1,105 @@
+# coding=utf8
+import json
+import asyncio
+
+import tcroom
+
+
+def make_room(settings: dict) -> tcroom.Room:
+    room = tcroom.Room(False, None, None, None, None, None)
+    room.sent = []
+    room.send_command_to_room = room.sent.append
+    receive(room, {"method": "getSettings", "result": True, "settings": settings})
+    return room
+
+
+def receive(room: tcroom.Room, response: dict):
+    asyncio.run(room.processMessage(json.dumps(response)))
+
+
+def test_only_changed_keys_are_sent():
+    room = make_room({"a": 1, "b": 2, "c": [1, 2]})
+
+    report = room.applySettings({"a": 1, "b": 3, "c": [1, 2], "d": "x"})
+
+    assert len(room.sent) == 1
+    assert room.sent[0]["settings"] == {"b": 3, "d": "x"}
+    assert report["changed"] == 2
+    assert report["skipped"] == 2
+    assert report["bytes_saved"] > 0
+
+
+def test_nothing_is_sent_without_changes():
+    room = make_room({"a": 1})
+
+    report = room.applySettings({"a": 1})
+
+    assert room.sent == []
+    assert report == {"changed": 0, "skipped": 1, "bytes_sent": 0, "bytes_saved": report["bytes_saved"]}
+
+
+def test_response_updates_the_cache():
+    room = make_room({"a": 1, "b": 2})
+    room.applySettings({"b": 3})
+
+    receive(room, {"method": "setSettings", "requestId": room.sent[0]["requestId"], "result": True})
+
+    assert room.getCachedSettings() == {"a": 1, "b": 3}
+    assert room.pendingSettings == {}
+    room.applySettings({"b": 3})
+    assert len(room.sent) == 1
+
+
+def test_rejected_settings_are_not_cached():
+    room = make_room({"b": 2})
+    room.applySettings({"b": 5})
+
+    receive(room, {"method": "setSettings", "requestId": room.sent[0]["requestId"], "result": False})
+
+    assert room.getCachedSettings() == {"b": 2}
+    assert room.pendingSettings == {}
+
+
+def test_error_response_drops_the_pending_settings():
+    room = make_room({"b": 2})
+    room.applySettings({"b": 5})
+
+    receive(room, {"method": "setSettings", "requestId": room.sent[0]["requestId"], "result": False,
+                   "error": "Invalid value"})
+    assert room.pendingSettings == {}
+
+    # a later response without requestId must not confirm the rejected settings
+    room.setSettings({"c": 1})
+    receive(room, {"method": "setSettings", "result": True})
+    assert room.getCachedSettings() == {"b": 2, "c": 1}
+
+
+def test_response_without_request_id_does_not_confirm_apply_settings():
+    room = make_room({"b": 2})
+    room.applySettings({"b": 5})
+
+    receive(room, {"method": "setSettings", "result": True})
+
+    assert room.getCachedSettings() == {"b": 2}
+    assert len(room.pendingSettings) == 1
+
+
+def test_unnamed_responses_confirm_in_order():
+    room = make_room({})
+    room.setSettings({"a": 1})
+    room.setSettings({"a": 2})
+
+    receive(room, {"method": "setSettings", "result": True})
+    assert room.getCachedSettings() == {"a": 1}
+    receive(room, {"method": "setSettings", "result": True})
+    assert room.getCachedSettings() == {"a": 2}
+
+
+def test_error_response_without_method_drops_the_pending_settings():
+    room = make_room({"b": 2})
+    room.applySettings({"b": 5})
+
+    receive(room, {"requestId": room.sent[0]["requestId"], "error": "Invalid value"})
+
+    assert room.pendingSettings == {}
+    assert room.getCachedSettings() == {"b": 2}
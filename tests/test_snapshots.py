@@ -0,0 +1,101 @@
+# coding=utf8
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import tcroom
+
+
+class FakeRoom:
+    def __init__(self, ip: str, active: dict):
+        self.ip = ip
+        self.active = active
+        self.count = 0
+
+    def get_picture_selfview(self, timeout: float = None) -> bytes:
+        with self.active["lock"]:
+            self.active["now"] += 1
+            self.active["max"] = max(self.active["max"], self.active["now"])
+        time.sleep(0.02)
+        with self.active["lock"]:
+            self.active["now"] -= 1
+        self.count += 1
+        return f'{self.ip}-{self.count}'.encode()
+
+
+def make_rooms(n: int) -> list:
+    active = {"lock": threading.Lock(), "now": 0, "max": 0}
+    return [FakeRoom(f'10.0.0.{i}', active) for i in range(n)], active
+
+
+def test_frames_are_stored_under_the_concurrency_limit(tmp_path):
+    rooms, active = make_rooms(6)
+    store = tcroom.FrameStore(str(tmp_path))
+    scheduler = tcroom.SnapshotScheduler(rooms, store, interval=0.05, max_concurrency=2)
+
+    scheduler.start()
+    time.sleep(0.5)
+    scheduler.stop()
+    store.close()
+
+    assert active["max"] == 2
+    with tcroom.FrameStoreReader(str(tmp_path)) as reader:
+        assert sorted(reader.rooms()) == sorted(room.ip for room in rooms)
+        for room in rooms:
+            frames = [data for _, data in reader.frames(room.ip)]
+            assert frames == [f'{room.ip}-{i}'.encode() for i in range(1, room.count + 1)]
+            assert frames
+
+
+def test_stop_is_prompt(tmp_path):
+    rooms, _ = make_rooms(3)
+    store = tcroom.FrameStore(str(tmp_path))
+    scheduler = tcroom.SnapshotScheduler(rooms, store, interval=60)
+
+    scheduler.start()
+    time.sleep(0.1)
+    t = time.monotonic()
+    scheduler.stop()
+    store.close()
+
+    assert time.monotonic() - t < 1
+
+
+def test_stop_before_start_of_the_loop(tmp_path):
+    rooms, _ = make_rooms(1)
+    store = tcroom.FrameStore(str(tmp_path))
+    scheduler = tcroom.SnapshotScheduler(rooms, store, interval=60)
+
+    scheduler.start()
+    scheduler.stop()
+    store.close()
+
+    assert scheduler.thread is None
+
+
+class FrameHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "5")
+        self.end_headers()
+        self.wfile.write(b"frame")
+
+    def log_message(self, *args):
+        pass
+
+
+def test_get_picture_selfview():
+    server = HTTPServer(("127.0.0.1", 0), FrameHandler)
+    threading.Thread(target=server.serve_forever, args=(0.01,), daemon=True).start()
+    room = tcroom.Room(False, None, None, None, None, None)
+    room.ip = "127.0.0.1"
+    room.httpPort = server.server_address[1]
+
+    assert room.get_picture_selfview() is None
+
+    room.connection_status = tcroom.ConnectionStatus.normal
+    room.tokenForHttpServer = "token"
+    assert room.get_picture_selfview(timeout=5) == b"frame"
+
+    server.shutdown()
+    server.server_close()
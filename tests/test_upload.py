@@ -0,0 +1,126 @@
+# coding=utf8
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import tcroom
+
+
+class UploadHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        with self.server.lock:
+            self.server.uploads.append((dict(self.headers), body))
+            fileId = len(self.server.uploads)
+        self.send_response(200)
+        self.send_header("FileId", str(fileId))
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), UploadHandler)
+    server.uploads = []
+    server.lock = threading.Lock()
+    thread = threading.Thread(target=server.serve_forever, args=(0.01,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_room(server) -> tcroom.Room:
+    room = tcroom.Room(False, None, None, None, None, None)
+    room.ip = "127.0.0.1"
+    room.httpPort = server.server_address[1]
+    room.tokenForHttpServer = "token"
+    room.sent = []
+    room.send_command_to_room = room.sent.append
+    return room
+
+
+@pytest.fixture
+def image(tmp_path):
+    path = tmp_path / "background.png"
+    path.write_bytes(bytes(range(256)) * 1000)
+    return path
+
+
+def test_body_is_streamed_with_content_length(server, image):
+    room = make_room(server)
+
+    assert room.setBackground(str(image)) == 1
+
+    headers, body = server.uploads[0]
+    assert "Transfer-Encoding" not in headers
+    assert int(headers["Content-Length"]) == len(body)
+    assert headers["Content-Type"].startswith("multipart/form-data; boundary=")
+    assert image.read_bytes() in body
+    assert b'filename="background.png"' in body
+    assert room.sent == [{"method": "setBackground", "fileId": 1}]
+
+
+def test_multipart_stream_reads_by_chunks(image):
+    stream = tcroom.MultipartFileStream(str(image), chunk_size=4096)
+
+    chunks = list(stream)
+
+    assert len(b''.join(chunks)) == len(stream)
+    assert max(len(chunk) for chunk in chunks) == 4096
+
+
+def test_same_content_is_uploaded_once(server, image, tmp_path):
+    room = make_room(server)
+    copy = tmp_path / "copy.png"
+    copy.write_bytes(image.read_bytes())
+
+    assert room.uploadFile(str(image)) == 1
+    assert room.uploadFile(str(copy)) == 1
+    assert len(server.uploads) == 1
+
+
+def test_cache_is_cleared_on_connect(server, image, monkeypatch):
+    room = make_room(server)
+    room.uploadFile(str(image))
+
+    monkeypatch.setattr(tcroom, "getWebsocketPort", lambda ip, port: 8765)
+    monkeypatch.setattr(tcroom, "getHttpPort", lambda ip, port: server.server_address[1])
+    monkeypatch.setattr(tcroom.thread, "start_new_thread", lambda func, args: None)
+    room.connect("127.0.0.1", 80)
+
+    assert room.uploadedFiles == {}
+    assert room.uploadFile(str(image)) == 2
+
+
+def test_missing_file(server, tmp_path):
+    room = make_room(server)
+
+    assert room.uploadFile(str(tmp_path / "missing.png")) is None
+    assert room.setBackground(str(tmp_path / "missing.png")) is None
+    assert room.sent == []
+    assert server.uploads == []
+
+
+def test_set_background_for_rooms(server, image):
+    rooms = [make_room(server) for i in range(3)]
+    rooms[0].uploadedFiles[tcroom.file_digest(str(image))] = 42
+    broken = make_room(server)
+    broken.httpPort = None  # the upload URL is invalid: requests raises
+
+    result = tcroom.setBackgroundForRooms(rooms + [broken], str(image), max_workers=2)
+
+    assert result[rooms[0]] == 42
+    assert sorted([result[rooms[1]], result[rooms[2]]]) == [1, 2]
+    assert result[broken] is None
+    assert len(server.uploads) == 2
+
+
+def test_set_background_for_rooms_missing_file(server, tmp_path):
+    rooms = [make_room(server)]
+
+    assert tcroom.setBackgroundForRooms(rooms, str(tmp_path / "missing.png")) == {rooms[0]: None}